@@ -1,15 +1,24 @@
 import os
+import hashlib
+import asyncio
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-import pdfplumber
+import fitz  # PyMuPDF
+import faiss
+import torch
 from dotenv import load_dotenv
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_groq import ChatGroq
 from langchain.chains import RetrievalQA
-from multimodal_utils import convert_pdf_to_images, generate_exam_with_groq, create_pdf_report
+from langchain.globals import set_llm_cache
+from langchain_core.caches import InMemoryCache
+from multimodal_utils import convert_pdf_to_images, find_admin_pages, generate_exam_with_groq, create_pdf_report
 import json
 
 # Load .env
@@ -20,6 +29,121 @@ if not groq_api_key:
     st.error("Groq API Key not found. Please set it in .env file.")
     st.stop()
 
+# On-disk FAISS indexes, one directory per PDF hash and chunking setup
+INDEX_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".faiss_cache")
+
+# Per-PDF results kept in server RAM; older ones are reloaded from the on-disk cache
+MAX_CACHED_PDFS = 8
+
+# Chunk size and overlap in tokens of the embedding model
+CHUNK_SIZE = 100
+CHUNK_OVERLAP = 20
+
+# Embed on the GPU when there is one; int8 quantization only applies on CPU
+EMBEDDING_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+@st.cache_resource
+def get_llm_cache():
+    # Shared across reruns so a repeated question is answered without another Groq call
+    return InMemoryCache(maxsize=1000)
+
+set_llm_cache(get_llm_cache())
+
+@st.cache_resource
+def get_embedder():
+    # Loaded once per server process instead of on every rerun. Also returns a tag
+    # naming the weights that actually loaded, for cached index names: vectors are
+    # float32 either way, but int8 weights produce slightly different ones than fp32
+    embedder = HuggingFaceEmbeddings(
+        model_name="all-MiniLM-L6-v2",
+        model_kwargs={"device": EMBEDDING_DEVICE},
+        encode_kwargs={"batch_size": 256, "normalize_embeddings": True}
+    )
+
+    # int8 dynamic quantization of the Linear layers for faster CPU embedding.
+    # torch.ao eager-mode quantization is deprecated in newer torch releases, so
+    # keep the fp32 model if it is missing or fails on this build.
+    if EMBEDDING_DEVICE == "cpu":
+        try:
+            embedder.client = torch.ao.quantization.quantize_dynamic(
+                embedder.client, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            return embedder, "minilm-int8"
+        except Exception:
+            pass
+    return embedder, "minilm-fp32"
+
+def get_pdf_executor():
+    # Background thread for ReportLab builds, so questions render while the PDF is laid out.
+    # One per session: a user's export never queues behind another user's.
+    if "pdf_executor" not in st.session_state:
+        st.session_state.pdf_executor = ThreadPoolExecutor(max_workers=1)
+    return st.session_state.pdf_executor
+
+@st.cache_resource
+def get_splitter():
+    # Measures chunks with MiniLM's own tokenizer, so no second tokenizer download
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        get_embedder()[0].client.tokenizer,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+@st.cache_resource(max_entries=MAX_CACHED_PDFS)
+def save_uploaded_pdf(pdf_sha256, _uploaded_file):
+    # One temp copy per PDF, not one per rerun
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        shutil.copyfileobj(_uploaded_file, tmp_file, 1024 * 1024)
+        return tmp_file.name
+
+@st.cache_resource(max_entries=MAX_CACHED_PDFS)
+def extract_page_texts(pdf_sha256, _pdf_path):
+    with fitz.open(_pdf_path) as doc:
+        return [page.get_text("text") for page in doc]
+
+@st.cache_resource(max_entries=MAX_CACHED_PDFS)
+def build_vectorstore(pdf_sha256, _pdf_path):
+    # Keyed by the PDF hash only; extraction and splitting only run when an index is built
+    embedder, embedding_tag = get_embedder()
+
+    # Same PDF seen before (e.g. in an earlier session): load instead of re-embedding
+    index_path = os.path.join(INDEX_CACHE_DIR, f"{pdf_sha256}-{embedding_tag}-{CHUNK_SIZE}-{CHUNK_OVERLAP}")
+    index_files = [os.path.join(index_path, name) for name in ("index.faiss", "index.pkl")]
+    if all(os.path.isfile(path) for path in index_files):
+        try:
+            return FAISS.load_local(index_path, embedder, allow_dangerous_deserialization=True)
+        except Exception:
+            pass  # Unreadable cache entry: rebuild it below
+    shutil.rmtree(index_path, ignore_errors=True)
+
+    # HNSW graph index: logarithmic search instead of the exhaustive IndexFlatL2 scan
+    index = faiss.IndexHNSWFlat(embedder.client.get_sentence_embedding_dimension(), 32)
+    index.hnsw.efConstruction = 200
+    index.hnsw.efSearch = 64
+
+    vectorstore = FAISS(
+        embedding_function=embedder,
+        index=index,
+        docstore=InMemoryDocstore({}),
+        index_to_docstore_id={}
+    )
+    text = "\n".join(extract_page_texts(pdf_sha256, _pdf_path))
+    chunks = get_splitter().split_text(text)
+
+    # Repeated headers/footers produce identical chunks; embed each only once (order kept)
+    vectorstore.add_texts(list(dict.fromkeys(chunks)))
+
+    # Save to a temp dir and rename it into place, so a crash never leaves a half-written index
+    os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=INDEX_CACHE_DIR)
+    vectorstore.save_local(tmp_path)
+    try:
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # Another process saved the same index first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return vectorstore
+
 # Streamlit UI
 st.set_page_config(page_title="ExamForge - Multimodal RAG Exam Assistant", layout="wide")
 st.title("🔥 ExamForge")
@@ -32,26 +156,13 @@ uploaded_file = st.file_uploader("Upload a PDF file", type=["pdf"])
 if uploaded_file is not None:
     with st.spinner("Reading and processing PDF..."):
 
+        pdf_sha256 = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+
         # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            pdf_path = tmp_file.name
-
-        # Extract text 
-        text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text
-
-        # Chunking
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = splitter.split_text(text)
-
-        # Embeddings (Keep using free HuggingFace embeddings)
-        embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vectorstore = FAISS.from_texts(chunks, embedding_model)
+        pdf_path = save_uploaded_pdf(pdf_sha256, uploaded_file)
+
+        # Extract text, chunk and embed (Keep using free HuggingFace embeddings), cached per PDF across reruns
+        vectorstore = build_vectorstore(pdf_sha256, pdf_path)
 
         # LLM - Switch to Groq
         llm = ChatGroq(model="llama-3.3-70b-versatile", groq_api_key=groq_api_key)
@@ -93,11 +204,12 @@ if uploaded_file is not None:
                 
                 with st.spinner("Analyzing PDF and generating questions..."):
                     try:
-                        # 1. Convert ALL PDF pages to images
-                        images_b64 = convert_pdf_to_images(pdf_path)
+                        # 1. Convert all non-administrative PDF pages to images
+                        admin_pages = find_admin_pages(extract_page_texts(pdf_sha256, pdf_path))
+                        images_b64 = convert_pdf_to_images(pdf_path, skip_pages=admin_pages)
                         
                         # 2. Call Groq Utility with batch processing
-                        exam_json = generate_exam_with_groq(images_b64, groq_api_key, status_callback=update_status)
+                        exam_json = asyncio.run(generate_exam_with_groq(images_b64, groq_api_key, status_callback=update_status))
                         
                         status_placeholder.empty()
 
@@ -106,6 +218,9 @@ if uploaded_file is not None:
                         else:
                             st.success(f"Exam Generated! Total Questions: {len(exam_json['mcq']) + len(exam_json['short_answer']) + len(exam_json['essay'])}")
                             
+                            # Start the PDF export now; it is only needed once the questions are on screen
+                            pdf_future = get_pdf_executor().submit(create_pdf_report, exam_json)
+                            
                             # MCQs
                             if exam_json["mcq"]:
                                 st.subheader("Multiple Choice Questions")
@@ -136,7 +251,7 @@ if uploaded_file is not None:
                             st.divider()
                             st.subheader("📥 Export Exam")
                             try:
-                                pdf_content = create_pdf_report(exam_json)
+                                pdf_content = pdf_future.result()
                                 st.download_button(
                                     label="Download Exam PDF",
                                     data=pdf_content,
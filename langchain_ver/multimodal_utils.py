@@ -1,41 +1,79 @@
 import fitz  # PyMuPDF
-from groq import Groq
+from groq import AsyncGroq
 import os
+import asyncio
+import httpx
 import json
-import base64
 import io
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from render_utils import render_pages
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
-def convert_pdf_to_images(pdf_path):
+# Administrative pages the exam prompt tells the model to ignore anyway
+_ADMIN_RE = re.compile(
+    r"\b(syllabus|attendance|table of contents|course policy|welcome|acknowledg\w*|preface)\b",
+    re.I
+)
+_ADMIN_MAX_WORDS = 100
+
+def _is_admin_page(page_text):
     """
-    Converts a PDF file into a list of base64 encoded images (PNG).
+    Heuristic: a page is administrative if it is short and mentions an admin keyword.
+    Long pages are always kept, even when they open with "Welcome to lecture 5".
     """
-    doc = fitz.open(pdf_path)
-    base64_images = []
-    
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap()
-        img_data = pix.tobytes("png")
-        base64_img = base64.b64encode(img_data).decode('utf-8')
-        base64_images.append(base64_img)
-        
-    return base64_images
+    return len(page_text.split()) < _ADMIN_MAX_WORDS and _ADMIN_RE.search(page_text) is not None
 
-def generate_exam_with_groq(base64_images, api_key, status_callback=None):
+def find_admin_pages(page_texts):
     """
-    Sends PDF page images to Groq (Llama 4 Scout) in batches to generate a full exam.
-    Processes 5 pages at a time to stay within limits and cover the whole PDF.
+    Returns the indices of administrative pages (syllabus, attendance, TOC...)
+    so they can be skipped before rendering and sending them to Groq.
     """
-    client = Groq(api_key=api_key)
-    model = "meta-llama/llama-4-scout-17b-16e-instruct"
-    
-    # CONTENT RELEVANCE INSTRUCTIONS
-    prompt_template = """
+    return {i for i, page_text in enumerate(page_texts) if _is_admin_page(page_text)}
+
+# Smallest page count worth spreading across worker processes
+_MIN_PAGES_FOR_WORKERS = 32
+
+def convert_pdf_to_images(pdf_path, skip_pages=None):
+    """
+    Converts a PDF file into a list of (page_number, mime_type, base64) images:
+    8-bit PNG for grayscale pages, JPEG for photo-heavy colour pages when it is
+    smaller, PNG otherwise.
+    Larger PDFs are rendered in parallel across worker processes, in page order.
+    Page indices in skip_pages are left out; page_number is the 0-based index in the PDF.
+    """
+    skip_pages = skip_pages or set()
+    with fitz.open(pdf_path) as doc:
+        page_numbers = [i for i in range(doc.page_count) if i not in skip_pages]
+
+    if not page_numbers:
+        return []
+
+    workers = min(os.cpu_count() or 1, len(page_numbers))
+    # Small PDFs (or one CPU): starting worker processes costs more than it saves
+    if workers == 1 or len(page_numbers) < _MIN_PAGES_FOR_WORKERS:
+        return render_pages((pdf_path, page_numbers))
+
+    # One contiguous slice of pages per worker
+    slice_size = (len(page_numbers) + workers - 1) // workers
+    slices = [(pdf_path, page_numbers[start:start + slice_size])
+              for start in range(0, len(page_numbers), slice_size)]
+
+    base64_images = []
+    # Spawn fresh workers: forking the multi-threaded Streamlit server (torch/CUDA loaded) can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for images in executor.map(render_pages, slices):
+            base64_images.extend(images)
+
+    return base64_images
+
+# CONTENT RELEVANCE INSTRUCTIONS
+_PROMPT_TEMPLATE = """
     You are an expert professor designed to help students prepare for exams.
     Analyze the provided images, which represent pages from a study material PDF.
     
@@ -53,6 +91,17 @@ def generate_exam_with_groq(base64_images, api_key, status_callback=None):
       "essay": [{{ "question": "...", "key_points_to_cover": "..." }}]
     }}
     """
+
+# Shared text prefix of every batch request; only the page images differ per batch
+_PROMPT_CONTENT = ({"type": "text", "text": _PROMPT_TEMPLATE},)
+
+async def generate_exam_with_groq(base64_images, api_key, status_callback=None):
+    """
+    Sends PDF page images to Groq (Llama 4 Scout) in batches to generate a full exam.
+    Processes 5 pages at a time to stay within limits and cover the whole PDF.
+    Batches are sent concurrently (at most 8 in flight); results are merged in page order.
+    """
+    model = "meta-llama/llama-4-scout-17b-16e-instruct"
     
     all_results = {
         "mcq": [],
@@ -61,43 +110,75 @@ def generate_exam_with_groq(base64_images, api_key, status_callback=None):
     }
     
     batch_size = 5
+    max_concurrent_batches = 8
+    
+    # One shared HTTP/2 connection pool: concurrent batches multiplex over it
+    # instead of each paying for its own TCP/TLS handshake
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=60,
+        limits=httpx.Limits(max_connections=max_concurrent_batches)
+    )
+    client = AsyncGroq(api_key=api_key, http_client=http_client)
+    
     total_pages = len(base64_images)
+    total_batches = (total_pages + batch_size - 1) // batch_size
+    semaphore = asyncio.Semaphore(max_concurrent_batches)
+    completed_batches = 0
+    questions_so_far = 0
     
-    for i in range(0, total_pages, batch_size):
+    async def process_batch(i):
+        nonlocal completed_batches, questions_so_far
         batch = base64_images[i:i + batch_size]
         current_batch_num = (i // batch_size) + 1
-        total_batches = (total_pages + batch_size - 1) // batch_size
+        # Original PDF page numbers; administrative pages may have been skipped
+        first_page = batch[0][0] + 1
+        last_page = batch[-1][0] + 1
         
-        if status_callback:
-            status_callback(f"Processing batch {current_batch_num} of {total_batches} (Pages {i+1} to {min(i+batch_size, total_pages)})...")
-        
-        content = [{"type": "text", "text": prompt_template}]
-        for img_b64 in batch:
-            content.append({
+        content = list(_PROMPT_CONTENT) + [
+            {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{img_b64}"}
-            })
+                "image_url": {"url": f"data:{mime_type};base64,{img_b64}"}
+            }
+            for _, mime_type, img_b64 in batch
+        ]
+        
+        async with semaphore:
+            if status_callback:
+                status_callback(f"Processing batch {current_batch_num} of {total_batches} (Pages {first_page} to {last_page})...")
             
-        try:
-            completion = client.chat.completions.create(
+            completion = await client.chat.completions.create(
                 model=model,
                 messages=[{"role": "user", "content": content}],
                 response_format={"type": "json_object"},
                 temperature=0.1,
                 max_tokens=2048
             )
-            
-            result = json.loads(completion.choices[0].message.content)
-            
-            # Merge results
-            if "mcq" in result: all_results["mcq"].extend(result["mcq"])
-            if "short_answer" in result: all_results["short_answer"].extend(result["short_answer"])
-            if "essay" in result: all_results["essay"].extend(result["essay"])
-            
-        except Exception as e:
+        
+        result = json.loads(completion.choices[0].message.content)
+        
+        # Report partial progress as each batch lands rather than after the whole exam
+        completed_batches += 1
+        questions_so_far += sum(len(result.get(key) or []) for key in all_results)
+        if status_callback:
+            status_callback(f"Finished {completed_batches} of {total_batches} batches ({questions_so_far} questions so far)...")
+        
+        return result
+    
+    async with client:
+        tasks = [asyncio.create_task(process_batch(i)) for i in range(0, total_pages, batch_size)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    for batch_index, result in enumerate(results):
+        if isinstance(result, Exception):
             if status_callback:
-                status_callback(f"⚠️ Error in batch {current_batch_num}: {str(e)}")
+                status_callback(f"⚠️ Error in batch {batch_index + 1}: {str(result)}")
             continue
+        
+        # Merge results
+        if "mcq" in result: all_results["mcq"].extend(result["mcq"])
+        if "short_answer" in result: all_results["short_answer"].extend(result["short_answer"])
+        if "essay" in result: all_results["essay"].extend(result["essay"])
 
     return all_results
 
@@ -142,66 +223,54 @@ def create_pdf_report(exam_json):
         spaceAfter=4
     )
     
+    # Spacers carry no layout state, so one instance of each can be reused
+    title_gap = Spacer(1, 0.2*inch)
+    question_gap = Spacer(1, 0.1*inch)
+    section_gap = Spacer(1, 0.15*inch)
+    
+    mcq = exam_json.get("mcq") or []
+    short_answer = exam_json.get("short_answer") or []
+    essay = exam_json.get("essay") or []
+    
     # Title
     story.append(Paragraph("Generated Exam Report", title_style))
-    story.append(Spacer(1, 0.2*inch))
+    story.append(title_gap)
+    
+    # The answer key is collected in the same pass over each section
+    answer_key = [PageBreak(), Paragraph("Answer Key", title_style), title_gap]
     
     # Section: MCQs
-    if exam_json.get("mcq"):
+    if mcq:
         story.append(Paragraph("Part I: Multiple Choice Questions", section_style))
-        for i, q in enumerate(exam_json["mcq"]):
-            # Question
-            question_text = f"{i+1}. {q.get('question', 'N/A')}"
-            story.append(Paragraph(question_text, question_style))
-            
-            # Options
-            for opt in q.get('options', []):
-                story.append(Paragraph(f"• {opt}", option_style))
-            story.append(Spacer(1, 0.1*inch))
+        answer_key.append(Paragraph("Multiple Choice Answers:", section_style))
+        for i, q in enumerate(mcq, 1):
+            story.append(Paragraph(f"{i}. {q.get('question', 'N/A')}", question_style))
+            story.extend(Paragraph(f"• {opt}", option_style) for opt in q.get('options', []))
+            story.append(question_gap)
+            answer_key.append(Paragraph(f"{i}. {q.get('answer', 'N/A')}", question_style))
+        answer_key.append(section_gap)
     
     # Section: Short Answer
-    if exam_json.get("short_answer"):
+    if short_answer:
         story.append(Paragraph("Part II: Short Answer Questions", section_style))
-        for i, q in enumerate(exam_json["short_answer"]):
-            question_text = f"{i+1}. {q.get('question', 'N/A')}"
-            story.append(Paragraph(question_text, question_style))
-            story.append(Spacer(1, 0.1*inch))
+        answer_key.append(Paragraph("Short Answer Reference:", section_style))
+        for i, q in enumerate(short_answer, 1):
+            story.append(Paragraph(f"{i}. {q.get('question', 'N/A')}", question_style))
+            story.append(question_gap)
+            answer_key.append(Paragraph(f"{i}. {q.get('answer', 'N/A')}", question_style))
+        answer_key.append(section_gap)
     
     # Section: Essay
-    if exam_json.get("essay"):
+    if essay:
         story.append(Paragraph("Part III: Essay Questions", section_style))
-        for i, q in enumerate(exam_json["essay"]):
-            question_text = f"{i+1}. {q.get('question', 'N/A')}"
-            story.append(Paragraph(question_text, question_style))
-            story.append(Spacer(1, 0.1*inch))
+        answer_key.append(Paragraph("Essay Key Points:", section_style))
+        for i, q in enumerate(essay, 1):
+            story.append(Paragraph(f"{i}. {q.get('question', 'N/A')}", question_style))
+            story.append(question_gap)
+            answer_key.append(Paragraph(f"{i}. {q.get('key_points_to_cover', 'N/A')}", question_style))
     
     # New page for Answer Key
-    story.append(PageBreak())
-    story.append(Paragraph("Answer Key", title_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    # MCQ Answers
-    if exam_json.get("mcq"):
-        story.append(Paragraph("Multiple Choice Answers:", section_style))
-        for i, q in enumerate(exam_json["mcq"]):
-            answer_text = f"{i+1}. {q.get('answer', 'N/A')}"
-            story.append(Paragraph(answer_text, question_style))
-        story.append(Spacer(1, 0.15*inch))
-    
-    # Short Answer Reference
-    if exam_json.get("short_answer"):
-        story.append(Paragraph("Short Answer Reference:", section_style))
-        for i, q in enumerate(exam_json["short_answer"]):
-            answer_text = f"{i+1}. {q.get('answer', 'N/A')}"
-            story.append(Paragraph(answer_text, question_style))
-        story.append(Spacer(1, 0.15*inch))
-    
-    # Essay Key Points
-    if exam_json.get("essay"):
-        story.append(Paragraph("Essay Key Points:", section_style))
-        for i, q in enumerate(exam_json["essay"]):
-            key_points = f"{i+1}. {q.get('key_points_to_cover', 'N/A')}"
-            story.append(Paragraph(key_points, question_style))
+    story.extend(answer_key)
     
     # Build PDF
     doc.build(story)
@@ -0,0 +1,63 @@
+import fitz  # PyMuPDF
+import base64
+
+# Page rendering for convert_pdf_to_images. Kept apart from multimodal_utils so
+# spawned render workers only import PyMuPDF, not groq/httpx/reportlab.
+
+def _is_grayscale(pix):
+    """
+    Returns True if every pixel of an RGB pixmap has R == G == B.
+    """
+    if pix.n != 3:
+        return False
+    samples = pix.samples
+    red = samples[0::3]
+    return red == samples[1::3] and red == samples[2::3]
+
+# Share of the page that raster images must cover before JPEG is worth trying
+_PHOTO_PAGE_MIN_COVERAGE = 0.3
+
+def _image_coverage(page):
+    """
+    Returns the fraction of the page area covered by raster images.
+    """
+    page_rect = page.rect
+    covered = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page_rect
+        if not bbox.is_empty:
+            covered += bbox.width * bbox.height
+    return min(covered / (page_rect.width * page_rect.height), 1.0)
+
+def render_pages(args):
+    """
+    Worker for convert_pdf_to_images: renders a slice of pages to
+    (page_number, mime_type, base64) tuples.
+    May run in a separate process, so it opens its own handle on the PDF.
+    """
+    pdf_path, page_numbers = args
+    base64_images = []
+
+    with fitz.open(pdf_path) as doc:
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            pix = page.get_pixmap()
+            # Grayscale pages encode as 8-bit PNGs, about a third of the size.
+            # JPEG is only tried on photo-heavy pages, and kept only if it is
+            # actually smaller: on text and vector diagrams it is larger than
+            # PNG and blurs the lines the model has to read.
+            if _is_grayscale(pix):
+                mime_type = "image/png"
+                img_data = fitz.Pixmap(fitz.csGRAY, pix).tobytes("png")
+            else:
+                mime_type = "image/png"
+                img_data = pix.tobytes("png")
+                if _image_coverage(page) >= _PHOTO_PAGE_MIN_COVERAGE:
+                    jpeg_data = pix.tobytes("jpeg", jpg_quality=85)
+                    if len(jpeg_data) < len(img_data):
+                        mime_type = "image/jpeg"
+                        img_data = jpeg_data
+            base64_img = base64.b64encode(img_data).decode('utf-8')
+            base64_images.append((page_num, mime_type, base64_img))
+
+    return base64_images